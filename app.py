@@ -1,19 +1,26 @@
 #!/usr/bin/env python3
 """
-Single-file FastAPI app with a health endpoint and PostgreSQL DB setup using SQLAlchemy.
-Minimal dependencies: fastapi, uvicorn, sqlalchemy, psycopg2-binary
+Single-file FastAPI app with a health endpoint and PostgreSQL DB setup using async SQLAlchemy.
+Minimal dependencies: fastapi, uvicorn, sqlalchemy, asyncpg
 """
 
+import asyncio
 import os
+import random
+import secrets
+import sys
 import time
-from typing import Generator
+from typing import Any, AsyncGenerator, Awaitable, Callable, List
 
-from fastapi import Depends, FastAPI, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, create_engine, text
-from sqlalchemy.exc import OperationalError
+import asyncpg
+from cachetools import TTLCache
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import Column, Integer, String, bindparam, insert, select, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, sessionmaker
 
 # ---------------------------------------------------
 # App host/port (needed for local python app.py runs)
@@ -21,6 +28,10 @@ from sqlalchemy.orm import Session, sessionmaker
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", 8000))
 
+# Each worker opens its own DB pool, so total connections scale with this
+_DEFAULT_WORKERS = min(2 * (os.cpu_count() or 1) + 1, 8)
+WORKERS = int(os.getenv("WEB_CONCURRENCY", os.getenv("WORKERS", str(_DEFAULT_WORKERS))))
+
 # ---------------------------------------------------
 # PostgreSQL connection config
 # ---------------------------------------------------
@@ -30,21 +41,55 @@ DB_HOST = os.getenv("POSTGRES_HOST", "postgres")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "appdb")
 
+# One-shot DDL step (python app.py with RUN_MIGRATIONS=1), run before the app starts
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "0") == "1"
+
+# Token required by /admin/* endpoints; they are disabled when unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
 SQLALCHEMY_DATABASE_URL = (
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# ---------------------------------------------------
+# Connection pool sizing (per worker process)
+# Keep Postgres max_connections >= workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) + headroom.
+# By default a total budget (DB_MAX_CONNECTIONS, under postgres' default
+# max_connections=100) is split across workers, 2/3 pooled and 1/3 overflow.
+# ---------------------------------------------------
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+_PER_WORKER_CONNECTIONS = max(DB_MAX_CONNECTIONS // max(WORKERS, 1), 1)
+_DEFAULT_POOL_SIZE = max(_PER_WORKER_CONNECTIONS * 2 // 3, 1)
+_DEFAULT_MAX_OVERFLOW = max(_PER_WORKER_CONNECTIONS - _DEFAULT_POOL_SIZE, 0)
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(_DEFAULT_POOL_SIZE)))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(_DEFAULT_MAX_OVERFLOW)))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Pre-ping costs a round-trip per checkout; stale connections are instead
+# recycled and retried once on first use. Enable in staging if needed.
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+
 # ---------------------------------------------------
 # SQLAlchemy setup
 # ---------------------------------------------------
-engine = create_engine(
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
+    pool_pre_ping=POOL_PRE_PING,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_recycle=POOL_RECYCLE,
+    pool_timeout=POOL_TIMEOUT,
+    # SQLAlchemy compiled-statement cache (default 500)
+    query_cache_size=1200,
+    # Server-side prepared statements cached per asyncpg connection
+    connect_args={
+        "statement_cache_size": 500,
+        "prepared_statement_cache_size": 500,
+    },
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -57,6 +102,15 @@ class Employee(Base):
     name = Column(String(255), nullable=False, index=True)
 
 
+# ---------------------------------------------------
+# Statements built once at import and reused per request
+# ---------------------------------------------------
+_PROBE_STMT = text("SELECT 1")
+_GET_EMP_STMT = select(Employee).where(Employee.id == bindparam("i"))
+_INSERT_EMP_STMT = insert(Employee)
+_ANALYZE_EMP_STMT = text(f"ANALYZE {Employee.__tablename__}")
+
+
 # ---------------------------------------------------
 # Pydantic schemas
 # ---------------------------------------------------
@@ -64,62 +118,182 @@ class EmployeeCreate(BaseModel):
     name: str
 
 class EmployeeOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
 
-    class Config:
-        orm_mode = True
+
+# Below this many rows the VALUES insert is cheaper than setting up a COPY
+BULK_COPY_THRESHOLD = 100
+# Refresh planner stats after imports larger than this
+BULK_ANALYZE_THRESHOLD = 10_000
+
+# Per-worker cache of recent get_employee results; the event loop is
+# single-threaded, so no lock is needed.
+_emp_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
 
 
 # ---------------------------------------------------
 # FastAPI App
 # ---------------------------------------------------
-app = FastAPI(title="FastAPI + PostgreSQL Application")
+app = FastAPI(
+    title="FastAPI + PostgreSQL Application",
+    default_response_class=ORJSONResponse,
+)
 
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency that yields a DB session."""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# Errors meaning the asyncpg connection itself is gone. Raw driver calls (COPY)
+# raise these untranslated, never as DBAPIError.connection_invalidated; a closed
+# connection surfaces as InterfaceError("connection is closed").
+_ASYNCPG_CONNECTION_ERRORS = (
+    asyncpg.exceptions.InterfaceError,
+    asyncpg.exceptions.PostgresConnectionError,
+    ConnectionError,
+)
+
+
+async def run_with_reconnect(db: AsyncSession, operation: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs a DB operation, retrying once if its pooled connection was dead.
+
+    operation must not commit: the retry is only safe because uncommitted work
+    dies with the connection, so callers commit after this returns.
+    """
+    try:
+        return await operation()
+    except DBAPIError as e:
+        if not e.connection_invalidated:
+            raise
+        await db.rollback()
+    except _ASYNCPG_CONNECTION_ERRORS:
+        # SQLAlchemy never saw this error, so drop the dead connection ourselves
+        await db.invalidate()
+    return await operation()
+
+
+async def require_admin_token(x_api_token: str = Header(default="")) -> None:
+    """Dependency that rejects requests without the admin API token."""
+    # Compare as bytes: compare_digest rejects non-ASCII str input with TypeError
+    if not ADMIN_API_TOKEN or not secrets.compare_digest(x_api_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
 
 # ---------------------------------------------------
-# Startup event: ensure DB tables, wait for DB ready
+# DB readiness & migrations
 # ---------------------------------------------------
-@app.on_event("startup")
-def startup_event():
-    max_retries = 10
-    for attempt in range(1, max_retries + 1):
+async def retry_db(operation: Callable[[], Awaitable[None]], budget: float = 60.0) -> bool:
+    """Runs operation() until the DB accepts it; returns False once the time budget is spent."""
+    deadline = time.monotonic() + budget
+    delay = 0.2
+    attempt = 0
+    while time.monotonic() < deadline:
+        attempt += 1
         try:
-            Base.metadata.create_all(bind=engine)
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            app.state.db_ready = True
-            print("DB connected and tables ensured.")
-            return
-        except OperationalError as e:
-            app.state.db_ready = False
-            wait = min(2 ** attempt, 10)
-            print(f"DB not ready (attempt {attempt}/{max_retries}): {e!r}. Retrying in {wait}s...")
-            time.sleep(wait)
+            await operation()
+            return True
+        except (
+            OperationalError,
+            OSError,
+            asyncpg.exceptions.CannotConnectNowError,
+            asyncpg.exceptions.PostgresConnectionError,
+        ) as e:
+            # SQLAlchemy doesn't wrap errors raised inside asyncpg.connect(), so a DB
+            # that is down surfaces as OSError (connection refused) and one that is
+            # still booting as CannotConnectNowError (sqlstate 57P03).
+            # Capped exponential backoff with jitter so workers don't retry in lockstep
+            wait = min(delay + random.random() * delay, max(deadline - time.monotonic(), 0))
+            print(f"event=db_not_ready attempt={attempt} retry_in={wait:.2f}s error={e!r}")
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, 5.0)
+    return False
+
+
+async def run_migrations() -> bool:
+    """Creates DB tables. Run once per deploy, not from the serving workers."""
+    async def _create_all():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    ok = await retry_db(_create_all)
+    print("Tables ensured." if ok else "Could not connect to DB after retries. Migrations not applied.")
+    await engine.dispose()
+    return ok
+
+
+async def probe_db() -> None:
+    """Runs SELECT 1, retrying once if the pooled connection was dead.
+
+    Pre-ping is off, so after a DB restart the first checkout can hand back a
+    stale connection; without the retry the probe would report the DB down.
+    """
+    async def _probe():
+        async with engine.connect() as conn:
+            await conn.execute(_PROBE_STMT)
+
+    try:
+        await _probe()
+    except DBAPIError as e:
+        if not e.connection_invalidated:
+            raise
+        await _probe()
+
 
-    print("Could not connect to DB after retries. App will start but /health will report DB down.")
+# ---------------------------------------------------
+# Startup event: wait for DB ready
+# ---------------------------------------------------
+@app.on_event("startup")
+async def startup_event():
+    app.state.db_ready = await retry_db(probe_db)
+    if app.state.db_ready:
+        print("DB connected.")
+    else:
+        print("Could not connect to DB after retries. App will start but /health will report DB down.")
 
 
 # ---------------------------------------------------
 # Health Check
 # ---------------------------------------------------
+# Per-worker cache of the last successful DB probe, so frequent
+# load-balancer polling doesn't turn into one query per hit.
+_HEALTH_TTL = 1.0
+# How old the last successful probe may be while a saturated pool skips probing
+_HEALTH_SATURATED_MAX_AGE = 10.0
+_last_ok: float = 0.0
+
+
 @app.get("/health", tags=["health"])
-def health():
+async def health():
     """Returns OK + DB status."""
+    global _last_ok
     response = {"status": "ok", "db": "unknown"}
 
+    now = time.monotonic()
+    if now - _last_ok < _HEALTH_TTL:
+        response["db"] = "ok"
+        return response
+
+    # Every connection is checked out serving traffic: a probe would only queue
+    # behind real requests for a pool slot. Only trust that while the last probe
+    # is recent, since a stalled DB also leaves every connection checked out.
+    # MAX_OVERFLOW < 0 means unlimited overflow, so the pool never saturates.
+    pool = engine.pool
+    if (
+        MAX_OVERFLOW >= 0
+        and now - _last_ok < _HEALTH_SATURATED_MAX_AGE
+        and pool.checkedout() >= pool.size() + MAX_OVERFLOW
+    ):
+        response["db"] = "ok"
+        return response
+
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        await probe_db()
+        _last_ok = now
         response["db"] = "ok"
         return response
     except Exception:
@@ -131,33 +305,137 @@ def health():
 # CRUD Endpoints
 # ---------------------------------------------------
 @app.post("/employees", response_model=EmployeeOut, tags=["employees"])
-def create_employee(payload: EmployeeCreate, db: Session = Depends(get_db)):
+async def create_employee(payload: EmployeeCreate, db: AsyncSession = Depends(get_db)):
     emp = Employee(name=payload.name)
-    db.add(emp)
-    db.commit()
-    db.refresh(emp)
+
+    async def _insert():
+        db.add(emp)
+        # INSERT ... RETURNING fills emp.id; expire_on_commit=False keeps it loaded,
+        # so no follow-up SELECT (refresh) is needed.
+        await db.flush()
+
+    await run_with_reconnect(db, _insert)
+    await db.commit()
+    _emp_cache.pop(emp.id, None)
     return emp
 
 
+@app.post("/employees/bulk", tags=["employees"])
+async def create_employees_bulk(payload: List[EmployeeCreate], db: AsyncSession = Depends(get_db)):
+    if len(payload) < BULK_COPY_THRESHOLD:
+        async def _insert():
+            await db.execute(_INSERT_EMP_STMT, [{"name": e.name} for e in payload])
+
+        if payload:
+            await run_with_reconnect(db, _insert)
+            await db.commit()
+        return {"inserted": len(payload)}
+
+    # Large batches: stream rows with COPY on the raw asyncpg connection. SQLAlchemy
+    # doesn't track transactions opened at the driver level, so COPY gets its own
+    # (otherwise asyncpg would autocommit it and db.commit() would do nothing).
+    async def _invalidate_if_closed(driver_conn) -> None:
+        # SQLAlchemy never sees raw driver errors, so without this a dead
+        # connection would go back into the pool looking valid.
+        if driver_conn.is_closed():
+            await db.invalidate()
+
+    async def _copy():
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        driver_conn = raw.driver_connection
+        try:
+            tr = driver_conn.transaction()
+            await tr.start()
+            try:
+                await driver_conn.copy_records_to_table(
+                    Employee.__tablename__,
+                    records=[(e.name,) for e in payload],
+                    columns=["name"],
+                )
+            except BaseException:
+                # SQLAlchemy won't roll back a driver-level transaction on checkin
+                if not driver_conn.is_closed():
+                    await tr.rollback()
+                raise
+        except BaseException:
+            await _invalidate_if_closed(driver_conn)
+            raise
+        return driver_conn, tr
+
+    # Commit outside the retry so a dropped connection can't replay committed rows
+    driver_conn, tr = await run_with_reconnect(db, _copy)
+    try:
+        await tr.commit()
+    except BaseException:
+        await _invalidate_if_closed(driver_conn)
+        raise
+    await db.commit()
+
+    if len(payload) > BULK_ANALYZE_THRESHOLD:
+        await run_with_reconnect(db, lambda: db.execute(_ANALYZE_EMP_STMT))
+        await db.commit()
+    return {"inserted": len(payload)}
+
+
 @app.get("/employees/{emp_id}", response_model=EmployeeOut, tags=["employees"])
-def get_employee(emp_id: int, db: Session = Depends(get_db)):
-    emp = db.query(Employee).filter(Employee.id == emp_id).first()
+async def get_employee(emp_id: int, db: AsyncSession = Depends(get_db)):
+    cached = _emp_cache.get(emp_id)
+    if cached is not None:
+        return cached
+
+    async def _select():
+        result = await db.execute(_GET_EMP_STMT, {"i": emp_id})
+        return result.scalar_one_or_none()
+
+    emp = await run_with_reconnect(db, _select)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
-    return emp
+    out = EmployeeOut.model_validate(emp)
+    _emp_cache[emp_id] = out
+    return out
+
+
+# ---------------------------------------------------
+# Admin Endpoints
+# ---------------------------------------------------
+@app.post("/admin/analyze", tags=["admin"], dependencies=[Depends(require_admin_token)])
+async def analyze_employees(db: AsyncSession = Depends(get_db)):
+    """Refreshes Postgres planner statistics for the employees table."""
+    await run_with_reconnect(db, lambda: db.execute(_ANALYZE_EMP_STMT))
+    await db.commit()
+    return {"status": "ok"}
 
 
 # ---------------------------------------------------
 # Root endpoint
 # ---------------------------------------------------
 @app.get("/")
-def root():
+async def root():
     return {"message": "Hello — FastAPI app is running. Check /health."}
 
 
 # ---------------------------------------------------
-# Local execution (not used in Docker)
+# Local execution / one-shot migrations
 # ---------------------------------------------------
+# When run as a script this module is "__main__", and in each worker uvicorn
+# spawns for workers > 1 it is re-run as "__mp_main__". Register it as "app" so
+# uvicorn's "app:app" import reuses it instead of executing it a second time
+# with its own engine and pool.
+if __name__ in ("__main__", "__mp_main__"):
+    sys.modules.setdefault("app", sys.modules[__name__])
+
 if __name__ == "__main__":
+    if RUN_MIGRATIONS:
+        sys.exit(0 if asyncio.run(run_migrations()) else 1)
+
     import uvicorn
-    uvicorn.run("app:app", host=APP_HOST, port=APP_PORT, reload=False, workers=1)
+    uvicorn.run(
+        "app:app",
+        host=APP_HOST,
+        port=APP_PORT,
+        loop="uvloop",
+        http="httptools",
+        reload=False,
+        workers=WORKERS,
+    )
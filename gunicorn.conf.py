@@ -0,0 +1,27 @@
+"""
+Gunicorn config for running app.py with uvicorn workers.
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+
+from app import APP_HOST, APP_PORT, WORKERS
+
+bind = f"{APP_HOST}:{APP_PORT}"
+# app.py divides its DB connection budget by this, so more workers
+# means smaller per-worker pools rather than more Postgres connections
+workers = WORKERS
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master so workers share its code pages copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Give each worker a fresh DB pool instead of the master's inherited sockets.
+
+    Required whenever preload_app is on, since app.py creates the engine at import.
+    close=False drops the inherited pool without closing connections the master
+    (or a sibling worker) may still be using.
+    """
+    from app import engine
+
+    engine.sync_engine.dispose(close=False)